@@ -0,0 +1,119 @@
+# demo.py
+# Example usage of the question generator and exam formatter.
+# Requires GEMINI_API_KEY; run from the exam_generation_system directory:
+#     python examples/demo.py
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from ai_question_generator import generate_questions_from_text
+from exam_formatter import format_exam_paper
+
+if __name__ == '__main__':
+    sample_exam_details = {
+        "school_name": "My Awesome School",
+        "exam_title": "Mid-Term Examination - 2024",
+        "class_level": "10th",
+        "subject": "Physics",
+        "total_time": "2:30 Hours",
+        "total_marks": 100,
+        "version": "B"
+    }
+
+    # Generate some questions
+    sample_questions = generate_questions_from_text(
+        text_content="This is some physics related text about Newton's laws and thermodynamics.",
+        num_mcq=3,
+        num_short_answer=2,
+        num_long_answer=1,
+        subject="Physics",
+        grade_level="10th"
+    )
+
+    sample_section_config = {
+        "A": {
+            "title": "SECTION A - Multiple Choice",
+            "instructions": "Choose the best answer for each question. Each question carries 2 marks.",
+            "time_allowed": "30 Minutes",
+            "marks_per_question": 2,
+            "total_marks_section": sum(q.get('marks', 2) for q in sample_questions["mcq"]) # Dynamically calculate
+        },
+        "B": {
+            "title": "SECTION B - Short Answer Questions",
+            "instructions": "Answer any two questions. Each question carries 10 marks.",
+            "marks_per_question": 10,
+            "total_marks_section": sum(q.get('marks', 10) for q in sample_questions["short_answer"]) # Dynamically calculate
+        },
+        "C": {
+            "title": "SECTION C - Essay Questions",
+            "instructions": "Answer any one question. This question carries 30 marks.",
+            "marks_per_question": 30,
+            "total_marks_section": sum(q.get('marks', 30) for q in sample_questions["long_answer"]) # Dynamically calculate
+        }
+    }
+    # Update total marks based on generated questions for the example
+    sample_exam_details["total_marks"] = (
+        sample_section_config["A"]["total_marks_section"] + 
+        sample_section_config["B"]["total_marks_section"] + 
+        sample_section_config["C"]["total_marks_section"]
+    )
+
+
+    formatted_paper = format_exam_paper(sample_exam_details, sample_questions, sample_section_config)
+    print("\n--- Formatted Exam Paper ---")
+    print(formatted_paper)
+
+    # Test with one of the original sample structures
+    print("\n\n--- Testing with Math Sample Structure ---")
+    math_exam_details = {
+        "school_name": "Oriental Public School Mardan",
+        "exam_title": "Final Term Examination – 2025",
+        "class_level": "6th",
+        "subject": "MATH",
+        "total_time": "3:00 Hours",
+        "total_marks": 75,
+        "version": "A"
+    }
+    math_questions = generate_questions_from_text(
+        text_content="Math concepts for 6th grade.",
+        num_mcq=2, # Reduced for brevity in example
+        num_short_answer=2, # Reduced
+        num_long_answer=1, # Reduced
+        subject="Math",
+        grade_level="6th"
+    )
+    # Update marks in generated questions to match sample structure
+    for q in math_questions["mcq"]: q["marks"] = 1
+    for q in math_questions["short_answer"]: q["marks"] = 4 # (36 marks / 9 questions in sample)
+    for q in math_questions["long_answer"]: q["marks"] = 8 # (24 marks / 3 questions in sample)
+
+    math_section_config = {
+        "A": {
+            "title": "SECTION A",
+            "instructions": "Attempt this section on the MCQ’s Answer Sheet only... (details omitted for brevity)",
+            "time_allowed": "20 Minutes",
+            "marks_per_question": 1,
+            "total_marks_section": 15 # As per sample, actual questions might differ
+        },
+        "B": {
+            "title": "SECTION B",
+            "instructions": "Attempt any Nine (9) questions each carry equal marks.",
+            "marks_per_question": 4, 
+            "total_marks_section": 36
+        },
+        "C": {
+            "title": "SECTION C",
+            "instructions": "Attempt any Three (3) questions.",
+            "marks_per_question": 8,
+            "total_marks_section": 24
+        }
+    }
+    # Recalculate total marks for this specific test case based on config
+    math_exam_details["total_marks"] = (
+        math_section_config["A"]["total_marks_section"] + 
+        math_section_config["B"]["total_marks_section"] + 
+        math_section_config["C"]["total_marks_section"]
+    )
+
+    formatted_math_paper = format_exam_paper(math_exam_details, math_questions, math_section_config)
+    print(formatted_math_paper)
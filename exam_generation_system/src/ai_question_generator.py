@@ -1,25 +1,59 @@
 # Adding detailed logging to aid in debugging the question generation process.
 import google.generativeai as genai
+from google.generativeai import client as genai_client, protos
+from google.generativeai.types import content_types, generation_types, safety_types
+import asyncio
+import copy
+import functools
+import hashlib
+import logging
 import os
 import random
-from typing import Dict, List, Any, Optional
+import sys
+import threading
+from typing import Dict, List, Any, Optional, Sequence, Tuple
 import time
 import json
 import re
 import traceback
+from collections import OrderedDict, deque
 
 # Import specific exceptions for cleaner error handling
 from google.api_core import exceptions 
 
+# orjson is optional; it parses model responses several times faster than the stdlib
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 # --- Configuration ---
 API_KEY = os.getenv('GEMINI_API_KEY')
 if not API_KEY:
     raise ValueError("GEMINI_API_KEY environment variable not set.")
-genai.configure(api_key=API_KEY)
+API_ENDPOINT = 'generativelanguage.googleapis.com'
+# Every call in this module is async, so the clients share a single grpc_asyncio channel.
+genai.configure(
+    api_key=API_KEY,
+    transport='grpc_asyncio',
+    client_options={'api_endpoint': API_ENDPOINT}
+)
 
 # Rate limit configuration
 REQUESTS_PER_MINUTE = 14  # Keep slightly under the 15/min limit
 RETRY_BASE_DELAY = 2  # Base delay in seconds for exponential backoff
+VALIDATION_RETRY_DELAY = 0.2  # Malformed responses are re-prompted almost immediately
+MAX_CONCURRENT_REQUESTS = 14  # Upper bound on in-flight generation calls
+
+# Topics sharing more than this fraction of their words are treated as duplicates
+TOPIC_SIMILARITY_THRESHOLD = 0.7
+
+# Response cache configuration
+CACHE_ENABLED = os.getenv('EXAMGEN_CACHE', '1') != '0'
+CACHE_DIR = os.getenv('EXAMGEN_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'examgen'))
+CACHE_MAX_TEMPERATURE = 0.3  # Sampled (creative) calls are never cached
+CACHE_MEMORY_ENTRIES = 256
 
 # --- Model and Safety Settings ---
 MODEL_NAME = 'models/gemini-1.5-flash-latest' 
@@ -31,17 +65,268 @@ DEFAULT_SAFETY_SETTINGS = [
     {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
 ]
 
-# --- Utility Functions ---
-def log_progress(msg: str):
-    """Logs a message with a timestamp and flushes the output."""
-    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {msg}", flush=True)
+# --- Response Parsing ---
+_JSON_MD_RE = re.compile(r"```json\s*([\s\S]*?)\s*```", re.IGNORECASE)
+_JSON_DECODER = json.JSONDecoder()
+
+# --- Response Schemas ---
+MCQ_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "question": {"type": "string"},
+        "options": {"type": "array", "items": {"type": "string"}},
+        "correct_option_index": {"type": "integer"},
+    },
+    "required": ["question", "options", "correct_option_index"],
+}
+
+OPEN_QUESTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "question": {"type": "string"},
+        "guideline": {"type": "string"},
+    },
+    "required": ["question", "guideline"],
+}
+
+BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "mcq": {"type": "array", "items": MCQ_SCHEMA},
+        "short_answer": {"type": "array", "items": OPEN_QUESTION_SCHEMA},
+        "long_answer": {"type": "array", "items": OPEN_QUESTION_SCHEMA},
+    },
+    "required": ["mcq", "short_answer", "long_answer"],
+}
+
+# --- Generation Configs ---
+# Built once at import and shared by every call; treat them as read-only.
+_TOPIC_GEN_CFG = genai.types.GenerationConfig(
+    temperature=0.3,
+    max_output_tokens=512
+)
+
+# Per question type; the response schema makes Gemini return valid JSON of the right shape.
+_QUESTION_GEN_CFGS = {
+    question_type: genai.types.GenerationConfig(
+        temperature=0.7,
+        top_p=0.95,
+        max_output_tokens=1024,
+        response_mime_type="application/json",
+        response_schema=schema
+    )
+    for question_type, schema in (
+        ("mcq", MCQ_SCHEMA),
+        ("short_answer", OPEN_QUESTION_SCHEMA),
+        ("long_answer", OPEN_QUESTION_SCHEMA),
+    )
+}
+
+@functools.lru_cache(maxsize=16)
+def _batch_gen_config(total_questions: int):
+    return genai.types.GenerationConfig(
+        temperature=0.7,
+        top_p=0.95,
+        max_output_tokens=min(8192, 512 + 320 * total_questions),
+        response_mime_type="application/json",
+        response_schema=BATCH_SCHEMA
+    )
+
+# --- Prompt Templates ---
+# (excerpt token budget, template) per question type; the excerpt is substituted for {text}.
+_BASE_PROMPT_TEMPLATES = {
+    "mcq": (1250, """Generate exactly ONE multiple choice question with 4 unique options based on the provided text.
+The response MUST be a JSON object in this format:
+{{
+  "question": "Your question here?",
+  "options": ["Option A", "Option B", "Option C", "Option D"],
+  "correct_option_index": 0
+}}
+
+Text: {text}"""),
+    "short_answer": (1375, """Generate ONE short answer question based on the provided text.
+The response MUST be a JSON object in this format:
+{{ "question": "Your question here?", "guideline": "Guideline for answering here." }}
 
-log_progress(f"Using Gemini model: {MODEL_NAME}")
+Text content: {text}"""),
+    "long_answer": (1750, """Generate ONE detailed essay question based on the provided text.
+The response MUST be a JSON object in this format:
+{{ "question": "Your essay question here?", "guideline": "Comprehensive answer guideline here." }}
+
+Text content: {text}"""),
+}
+
+def _base_prompt(question_type: str, text_content: str, chars_per_token: float) -> str:
+    """Builds the base prompt for a question type from an excerpt of the book."""
+    excerpt_tokens, _ = _BASE_PROMPT_TEMPLATES[question_type]
+    return _render_base_prompt(question_type, truncate_to_tokens(text_content, excerpt_tokens, chars_per_token))
+
+@functools.lru_cache(maxsize=64)
+def _render_base_prompt(question_type: str, excerpt: str) -> str:
+    """Fills in a prompt template. Keyed on the excerpt, never the whole book, so
+    cached entries stay small and a different chars-per-token ratio gives a new entry."""
+    return _BASE_PROMPT_TEMPLATES[question_type][1].format(text=excerpt)
+
+# --- Logging ---
+# Set EXAMGEN_LOG=DEBUG to see every API attempt, or WARNING to silence progress messages.
+logger = logging.getLogger("examgen")
+logger.setLevel(os.getenv('EXAMGEN_LOG', 'INFO').upper())
+if not logger.handlers:
+    _log_handler = logging.StreamHandler(sys.stdout)
+    _log_handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S"))
+    logger.addHandler(_log_handler)
+    logger.propagate = False
+
+log_progress = logger.info
+
+log_progress("Using Gemini model: %s", MODEL_NAME)
 model = genai.GenerativeModel(
     MODEL_NAME,
     safety_settings=DEFAULT_SAFETY_SETTINGS
 )
 
+# --- Rate Limiting ---
+class TokenBucket:
+    """Token bucket for the async API calls. Jobs run their coroutines on the
+    one shared event loop, so every job draws on the same budget."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Takes a token (possibly going into debt) and returns how long to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    async def acquire_async(self):
+        delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+rate_limiter = TokenBucket(rate=REQUESTS_PER_MINUTE / 60, capacity=REQUESTS_PER_MINUTE)
+
+# --- Event Loop ---
+# All async API calls run on one long-lived loop: the async client caches its
+# gRPC channel on first use, so it must always be driven by the same loop.
+_loop = asyncio.new_event_loop()
+threading.Thread(target=_loop.run_forever, name="examgen-asyncio", daemon=True).start()
+
+def _run_coroutine(coro):
+    """Runs a coroutine on the shared event loop and blocks until it completes."""
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+# --- Text Truncation ---
+FALLBACK_CHARS_PER_TOKEN = 4.0  # Typical ratio for English text
+TOKENIZER_SAMPLE_CHARS = 8000
+CHARS_PER_TOKEN_ENTRIES = 16  # Books whose measured ratio is kept
+
+# sha256 of the book text -> measured ratio, least recently used first. Only
+# measure_chars_per_token touches it, and that always runs on the event loop thread.
+_chars_per_token_by_text: "OrderedDict[str, float]" = OrderedDict()
+
+async def measure_chars_per_token(text_content: str) -> float:
+    """Measures the text's characters-per-token ratio with one count_tokens call on a sample."""
+    text_key = hashlib.sha256(text_content.encode("utf-8")).hexdigest()
+    if text_key in _chars_per_token_by_text:
+        _chars_per_token_by_text.move_to_end(text_key)
+        return _chars_per_token_by_text[text_key]
+
+    sample = text_content[:TOKENIZER_SAMPLE_CHARS]
+    try:
+        total_tokens = (await model.count_tokens_async(sample)).total_tokens
+    except Exception as e:
+        # Not cached, so the next job for this book measures again
+        logger.warning("count_tokens failed, assuming %s chars/token: %s - %s", FALLBACK_CHARS_PER_TOKEN, type(e).__name__, e)
+        return FALLBACK_CHARS_PER_TOKEN
+    chars_per_token = len(sample) / total_tokens if total_tokens else FALLBACK_CHARS_PER_TOKEN
+
+    _chars_per_token_by_text[text_key] = chars_per_token
+    while len(_chars_per_token_by_text) > CHARS_PER_TOKEN_ENTRIES:
+        _chars_per_token_by_text.popitem(last=False)
+    return chars_per_token
+
+def truncate_to_tokens(text_content: str, max_tokens: int, chars_per_token: float) -> str:
+    """
+    Truncates text to about max_tokens tokens, ending on a word boundary, given
+    the text's ratio from measure_chars_per_token.
+    """
+    max_chars = int(max_tokens * chars_per_token)
+    if len(text_content) <= max_chars:
+        return text_content
+    head = text_content[:max_chars]
+    if text_content[max_chars].isspace():
+        return head
+    # Drop the partial last word, unless the head has no word boundary to cut at
+    return (head.rsplit(None, 1) or [head])[0]
+
+# --- Response Cache ---
+_memory_cache: "OrderedDict[str, Any]" = OrderedDict()
+_memory_cache_lock = threading.Lock()
+
+def _cache_key(*parts: str) -> str:
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+def _is_cacheable(generation_config) -> bool:
+    return CACHE_ENABLED and generation_config.temperature <= CACHE_MAX_TEMPERATURE
+
+# Entries are stored and handed out as deep copies: callers such as
+# generate_questions_from_text shuffle the lists they get back in place.
+def _remember(key: str, value: Any):
+    value = copy.deepcopy(value)
+    with _memory_cache_lock:
+        _memory_cache[key] = value
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > CACHE_MEMORY_ENTRIES:
+            _memory_cache.popitem(last=False)
+
+def _cache_get(key: str) -> Any:
+    """Returns a cached response from memory or disk, or None on a miss."""
+    with _memory_cache_lock:
+        if key in _memory_cache:
+            _memory_cache.move_to_end(key)
+            return copy.deepcopy(_memory_cache[key])
+
+    try:
+        with open(os.path.join(CACHE_DIR, f"{key}.json"), encoding="utf-8") as f:
+            value = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    _remember(key, value)
+    return value
+
+def _cache_set(key: str, value: Any):
+    """Stores a response in memory and persists it to CACHE_DIR."""
+    _remember(key, value)
+    path = os.path.join(CACHE_DIR, f"{key}.json")
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("Could not write response cache entry: %s", e)
+
+def _retry_delay_seconds(r_exc: exceptions.ResourceExhausted, attempt: int) -> float:
+    """
+    Returns the delay requested by the server's RetryInfo error detail (plus a
+    second of slack), or an exponential backoff if the error carries none.
+    """
+    for detail in r_exc.details or ():
+        retry_delay = getattr(detail, "retry_delay", None)
+        if retry_delay is not None:
+            return retry_delay.seconds + 1
+    return RETRY_BASE_DELAY * (2 ** attempt)
+
 def extract_json_from_response(text_response: str) -> Any:
     """
     Extracts a JSON object or list from a string, handling markdown and heuristics.
@@ -50,103 +335,160 @@ def extract_json_from_response(text_response: str) -> Any:
         log_progress("extract_json_from_response: Received empty text_response.")
         return None
 
-    match = re.search(r"```json\s*([\s\S]*?)\s*```", text_response, re.IGNORECASE)
+    match = _JSON_MD_RE.search(text_response)
     if match:
         json_str = match.group(1)
-        try: return json.loads(json_str)
+        try: return _json_loads(json_str)
         except json.JSONDecodeError as e: 
-            log_progress(f"extract_json_from_response: Failed to decode JSON from markdown block: {e}")
+            log_progress("extract_json_from_response: Failed to decode JSON from markdown block: %s", e)
             return None
 
-    first_b, first_sq_b = text_response.find('{'), text_response.find('[')
-    start_idx = min(first_b, first_sq_b) if first_b != -1 and first_sq_b != -1 else max(first_b, first_sq_b)
-    if start_idx != -1:
-        cand_str = text_response[start_idx:]; ob, osb, lci = 0,0,-1
-        for i,c in enumerate(cand_str):
-            if c=='{':ob+=1 
-            elif c=='}':ob-=1 
-            elif c=='[':osb+=1 
-            elif c==']':osb-=1
-            if ob==0 and osb==0 and (c=='}' or c==']'):
-                if (cand_str[0] == '{' and c == '}') or (cand_str[0] == '[' and c == ']'):
-                    lci = i
-                    break
-        if lci!=-1:
-            h_str=cand_str[:lci+1]
-            try: return json.loads(h_str)
-            except json.JSONDecodeError as e: 
-                log_progress(f"extract_json_from_response: Failed heuristic decode: {e}")
-    try: return json.loads(text_response)
+    for start_idx in sorted(i for i in (text_response.find('{'), text_response.find('[')) if i != -1):
+        try: return _JSON_DECODER.raw_decode(text_response, start_idx)[0]
+        except json.JSONDecodeError as e: 
+            log_progress("extract_json_from_response: Failed decode at offset %d: %s", start_idx, e)
+    try: return _json_loads(text_response)
     except json.JSONDecodeError as e: 
-        log_progress(f"extract_json_from_response: Failed full parse: {e}")
+        log_progress("extract_json_from_response: Failed full parse: %s", e)
         return None
 
-def analyze_text_for_topics(text_content: str, num_topics: int) -> List[str]:
+def _dedupe_similar_topics(topics: List[str], existing: Sequence[str] = (), threshold: float = TOPIC_SIMILARITY_THRESHOLD) -> List[str]:
+    """
+    Drops topics whose word-set Jaccard similarity to an already accepted (or
+    existing) topic exceeds threshold.
+    """
+    accepted, accepted_words = [], [set(topic.lower().split()) for topic in existing]
+    for topic in topics:
+        words = set(topic.lower().split())
+        if all(len(words & other) / max(len(words | other), 1) <= threshold for other in accepted_words):
+            accepted.append(topic)
+            accepted_words.append(words)
+    return accepted
+
+async def analyze_text_for_topics(
+    text_content: str,
+    num_topics: int,
+    generation_config=_TOPIC_GEN_CFG,
+    exclude_topics: Sequence[str] = (),
+    chars_per_token: float = FALLBACK_CHARS_PER_TOKEN
+) -> List[str]:
     """Analyzes text content using Gemini to identify distinct topics."""
-    log_progress(f"Analyzing text for {num_topics} distinct topics...")
+    log_progress("Analyzing text for %d distinct topics...", num_topics)
+    excerpt = truncate_to_tokens(text_content, 2000, chars_per_token)
+    exclusion = f"Do not repeat any of these topics, which are already covered: {json.dumps(list(exclude_topics))}\n" if exclude_topics else ""
     analysis_prompt = f"""Analyze the following text and identify {num_topics} distinct topics, themes, concepts, named entities (like specific people, companies, tools), or specific outcomes discussed within it.
 Provide the topics as a JSON array of strings. Each string should be a concise phrase (3-8 words) summarizing a topic.
 Ensure the topics are varied and cover different aspects mentioned in the text.
 Focus on specific details, names, or concepts.
+{exclusion}
+Text: {excerpt}"""
 
-Text: {text_content[:8000]}"""
-
-    generation_config = genai.types.GenerationConfig(
-        temperature=0.8,
-        max_output_tokens=512
-    )
+    cacheable = _is_cacheable(generation_config)
+    cache_key = _cache_key(MODEL_NAME, "topics", str(num_topics), str(generation_config.temperature), exclusion, excerpt)
+    if cacheable:
+        cached_topics = _cache_get(cache_key)
+        if cached_topics is not None:
+            log_progress("Using %d cached topics", len(cached_topics))
+            return cached_topics
 
     for attempt in range(3):
         try:
-            log_progress(f"Sending topic analysis prompt (Attempt {attempt + 1}/3)...")
-            response = model.generate_content(analysis_prompt, generation_config=generation_config)
+            logger.debug("Sending topic analysis prompt (Attempt %d/3)...", attempt + 1)
+            await rate_limiter.acquire_async()
+            response = await model.generate_content_async(analysis_prompt, generation_config=generation_config)
 
             if response.prompt_feedback and response.prompt_feedback.block_reason:
-                log_progress(f"Topic analysis prompt blocked. Reason: {response.prompt_feedback.block_reason}.")
+                log_progress("Topic analysis prompt blocked. Reason: %s.", response.prompt_feedback.block_reason)
                 return []
 
             if not response.parts:
-                log_progress(f"Topic analysis response has no parts.")
-                if attempt < 2: time.sleep(2 ** attempt); continue
+                log_progress("Topic analysis response has no parts.")
+                if attempt < 2: await asyncio.sleep(2 ** attempt); continue
                 return []
 
             parsed_data = extract_json_from_response(response.text)
 
             if parsed_data and isinstance(parsed_data, list):
                 cleaned_topics = [topic.strip() for topic in parsed_data]
-                unique_topics = list(dict.fromkeys(cleaned_topics))
-                log_progress(f"Successfully extracted {len(unique_topics)} unique topics")
+                unique_topics = _dedupe_similar_topics(cleaned_topics)
+                log_progress("Successfully extracted %d unique topics", len(unique_topics))
+                if cacheable:
+                    _cache_set(cache_key, unique_topics)
                 return unique_topics
             else:
-                if attempt < 2: time.sleep(2 ** attempt); continue
+                if attempt < 2: await asyncio.sleep(2 ** attempt); continue
                 return []
 
         except exceptions.ResourceExhausted as r_exc:
-            log_progress(f"RATE LIMIT HIT during topic analysis: {str(r_exc)[:500]}")
+            logger.warning("RATE LIMIT HIT during topic analysis: %s", r_exc.message)
             if attempt < 2:
-                delay_match = re.search(r"retry_delay {\s*seconds: (\d+)\s*}", str(r_exc))
-                sleep_for = int(delay_match.group(1)) + 1 if delay_match else (2 ** attempt) * 2
-                time.sleep(sleep_for)
+                await asyncio.sleep(_retry_delay_seconds(r_exc, attempt))
             else: return []
         except Exception as e:
-            log_progress(f"ERROR during topic analysis: {type(e).__name__} - {str(e)}")
-            if attempt < 2: time.sleep(2 ** attempt); continue
+            logger.warning("ERROR during topic analysis: %s - %s", type(e).__name__, e)
+            if attempt < 2: await asyncio.sleep(2 ** attempt); continue
             return []
     return []
 
-def generate_single_question_for_topic_with_retry(
+_STREAM_SAFETY_SETTINGS = safety_types.normalize_safety_settings(safety_types.to_easy_safety_dict(DEFAULT_SAFETY_SETTINGS))
+
+def _stream_request(prompt: str, generation_config) -> protos.GenerateContentRequest:
+    """Builds the request model.generate_content_async would send for a text prompt."""
+    contents = content_types.to_contents(prompt)
+    contents[-1].role = "user"
+    return protos.GenerateContentRequest(
+        model=MODEL_NAME,
+        contents=contents,
+        generation_config=generation_types.to_generation_config_dict(generation_config),
+        safety_settings=_STREAM_SAFETY_SETTINGS,
+    )
+
+async def _stream_json_text(prompt: str, generation_config) -> Tuple[str, Any]:
+    """
+    Streams a response that should be JSON and returns (text, block_reason).
+    Stops reading as soon as the first characters show the reply is not JSON,
+    so refusals and prose answers don't hold a request slot until completion.
+
+    The stream is opened on the client directly rather than through
+    model.generate_content_async so that this function owns the gRPC call:
+    leaving early cancels it, which ends generation on the server instead of
+    leaving the call open until it is garbage collected.
+    """
+    call = await genai_client.get_default_generative_async_client().stream_generate_content(
+        _stream_request(prompt, generation_config)
+    )
+    try:
+        response = await generation_types.AsyncGenerateContentResponse.from_aiterator(call)
+        chunks = []
+        head = ""
+        async for chunk in response:
+            if chunk.prompt_feedback and chunk.prompt_feedback.block_reason:
+                return "", chunk.prompt_feedback.block_reason
+            if not chunk.parts:
+                continue
+            chunks.append(chunk.text)
+            if len(head) < 3:
+                head = "".join(chunks).lstrip()[:3]
+                if head and head[0] not in "{[" and not "```".startswith(head):
+                    log_progress("Abandoning streamed response that does not start with JSON: %r...", head)
+                    break
+        return "".join(chunks), None
+    finally:
+        if not call.done():
+            call.cancel()
+
+async def generate_single_question_for_topic_with_retry(
     base_prompt: str,
     question_type: str,
     topic: str,
     generation_index: int,
-    max_api_calls: int = 3
+    generation_config=None,
+    max_rate_retries: int = 5,
+    max_validation_retries: int = 2,
+    max_error_retries: int = 2
 ) -> Optional[Dict[str, Any]]:
 
-    generation_config = genai.types.GenerationConfig(
-        temperature=0.7,
-        top_p=0.95,
-        max_output_tokens=1024
-    )
+    generation_config = generation_config or _QUESTION_GEN_CFGS[question_type]
 
     topic_instruction_prompt = (
         f"Generate a {question_type} question based on the provided text. "
@@ -157,66 +499,189 @@ def generate_single_question_for_topic_with_retry(
 
     modified_prompt = topic_instruction_prompt + base_prompt 
 
-    log_progress(f"Prompting for {question_type} (Gen {generation_index}) about topic: '{topic}'...")
+    logger.debug("Prompting for %s (Gen %s) about topic: '%s'...", question_type, generation_index, topic)
 
-    for api_call_attempt in range(max_api_calls):
+    rate_retries = validation_retries = error_retries = 0
+    prompt = modified_prompt
+
+    while True:
         try:
-            log_progress(f"Sending prompt for {question_type} (Gen {generation_index}, API call {api_call_attempt + 1}/{max_api_calls})")
+            logger.debug(
+                "Sending prompt for %s (Gen %s, rate retries %d/%d, validation retries %d/%d)",
+                question_type, generation_index, rate_retries, max_rate_retries, validation_retries, max_validation_retries
+            )
 
-            response = model.generate_content(modified_prompt, generation_config=generation_config)
+            await rate_limiter.acquire_async()
+            response_text, block_reason = await _stream_json_text(prompt, generation_config)
 
-            if response.prompt_feedback and response.prompt_feedback.block_reason:
-                log_progress(f"Prompt blocked for topic '{topic}'. Reason: {response.prompt_feedback.block_reason}")
+            if block_reason:
+                log_progress("Prompt blocked for topic '%s'. Reason: %s", topic, block_reason)
                 return None
 
-            if not response.parts:
-                if api_call_attempt < max_api_calls - 1: 
-                    time.sleep(1 * (api_call_attempt + 1))
-                    continue
-                return None
-
-            parsed_question_data = extract_json_from_response(response.text)
-
-            if parsed_question_data and isinstance(parsed_question_data, dict):
-                if question_type == "mcq":
-                    if not all(key in parsed_question_data for key in ["question", "options", "correct_option_index"]):
-                        if api_call_attempt < max_api_calls - 1: 
-                            time.sleep(1.5 * (api_call_attempt + 1))
-                            continue
-                        return None
-                elif question_type in ["short_answer", "long_answer"]:
-                    if not all(key in parsed_question_data for key in ["question", "guideline"]):
-                        if api_call_attempt < max_api_calls - 1: 
-                            time.sleep(1.5 * (api_call_attempt + 1))
-                            continue
-                        return None
-
-                if parsed_question_data.get("question") == "":
+            if not response_text:
+                problem = "Previous response was empty."
+            else:
+                try:
+                    parsed_question_data = _json_loads(response_text)
+                except json.JSONDecodeError:
+                    parsed_question_data = None
+                # The response schema guarantees the keys; only truncated or abandoned output fails here.
+                if not isinstance(parsed_question_data, dict):
+                    problem = "Previous response was not a complete JSON object."
+                elif parsed_question_data.get("question") == "":
                     return None
+                else:
+                    log_progress("Successfully generated %s for topic: '%s'", question_type, topic)
+                    return parsed_question_data
 
-                log_progress(f"Successfully generated {question_type} for topic: '{topic}'")
-                return parsed_question_data
-
-            else:
-                if api_call_attempt < max_api_calls - 1: 
-                    time.sleep(1.5 * (api_call_attempt + 1))
-                    continue
+            # Structural failures usually succeed on an immediate, corrected re-prompt.
+            if validation_retries >= max_validation_retries:
+                logger.warning("Giving up on %s for topic '%s': %s", question_type, topic, problem)
                 return None
+            validation_retries += 1
+            log_progress("Invalid %s response for topic '%s': %s Re-prompting...", question_type, topic, problem)
+            prompt = f"{modified_prompt}\n\n{problem} Return ONLY the JSON."
+            await asyncio.sleep(VALIDATION_RETRY_DELAY)
 
         except exceptions.ResourceExhausted as r_exc:
-            log_progress(f"RATE LIMIT HIT: {str(r_exc)[:500]}")
-            if api_call_attempt < max_api_calls - 1:
-                delay_match = re.search(r"retry_delay {\s*seconds: (\d+)\s*}", str(r_exc))
-                sleep_for = int(delay_match.group(1)) + 1 if delay_match else (2 ** api_call_attempt) * 2
-                time.sleep(sleep_for)
-            else: return None
+            logger.warning("RATE LIMIT HIT: %s", r_exc.message)
+            if rate_retries >= max_rate_retries:
+                return None
+            sleep_for = _retry_delay_seconds(r_exc, rate_retries)
+            rate_retries += 1
+            await asyncio.sleep(sleep_for)
         except Exception as e:
-            log_progress(f"ERROR: {type(e).__name__} - {str(e)}")
-            if api_call_attempt < max_api_calls - 1: 
-                time.sleep(2 ** api_call_attempt)
-            else: return None
+            logger.warning("ERROR: %s - %s", type(e).__name__, e)
+            if error_retries >= max_error_retries:
+                return None
+            await asyncio.sleep(2 ** error_retries)
+            error_retries += 1
+
+async def generate_all_questions_batched(
+    text_content: str,
+    num_mcq: int,
+    num_short_answer: int,
+    num_long_answer: int,
+    chars_per_token: float = FALLBACK_CHARS_PER_TOKEN
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Requests every question in a single structured-output call. Returns whatever
+    the model produced (possibly fewer than requested, or nothing on failure).
+    """
+    total_questions = num_mcq + num_short_answer + num_long_answer
+    batch_prompt = f"""Generate exam questions based on the provided text.
+Produce a JSON object with keys "mcq" (exactly {num_mcq} items), "short_answer" (exactly {num_short_answer} items) and "long_answer" (exactly {num_long_answer} items).
+- Each "mcq" item has a "question", exactly 4 unique "options" and the "correct_option_index" (0-3) of the right option.
+- Each "short_answer" item has a "question" and a "guideline" for answering it.
+- Each "long_answer" item is a detailed essay "question" with a comprehensive answer "guideline".
+Every question must cover a different topic, concept or detail from the text.
+
+Text content: {truncate_to_tokens(text_content, 1750, chars_per_token)}"""
+
+    generation_config = _batch_gen_config(total_questions)
+
+    log_progress("Requesting all %d questions in a single batched call...", total_questions)
+    try:
+        await rate_limiter.acquire_async()
+        response = await model.generate_content_async(batch_prompt, generation_config=generation_config)
+
+        if response.prompt_feedback and response.prompt_feedback.block_reason:
+            log_progress("Batched prompt blocked. Reason: %s", response.prompt_feedback.block_reason)
+            return {}
+
+        if not response.parts:
+            log_progress("Batched response has no parts.")
+            return {}
+
+        parsed_data = _json_loads(response.text)
+    except exceptions.ResourceExhausted as r_exc:
+        logger.warning("RATE LIMIT HIT during batched generation: %s", r_exc.message)
+        return {}
+    except Exception as e:
+        logger.warning("ERROR during batched generation: %s - %s", type(e).__name__, e)
+        return {}
+
+    if not isinstance(parsed_data, dict):
+        return {}
+
+    log_progress(
+        "Batched call returned %d MCQ, %d short and %d long questions",
+        len(parsed_data.get('mcq', [])), len(parsed_data.get('short_answer', [])), len(parsed_data.get('long_answer', []))
+    )
+    return parsed_data
+
+def _build_question(question_type: str, question_data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Converts a raw model response into the question structure used by the formatter."""
+    if not question_data:
+        return None
 
-    return None
+    # A malformed item (missing keys, wrong types) only drops itself
+    try:
+        if question_type == "mcq":
+            correct_answer_text_val = question_data['options'][question_data['correct_option_index']]
+            shuffled_options = list(question_data['options'])
+            random.shuffle(shuffled_options)
+            return {
+                "type": "mcq",
+                "question": question_data["question"],
+                "options": shuffled_options,
+                "correct_option_index": shuffled_options.index(correct_answer_text_val),
+                "marks": 1
+            }
+
+        return {
+            "type": question_type,
+            "question": question_data["question"],
+            "answer_guideline": question_data.get('guideline', ''),
+            "marks": 4 if question_type == "short_answer" else 8
+        }
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        logger.warning("Discarding malformed %s question: %s - %s", question_type, type(e).__name__, e)
+        return None
+
+async def _generate_concurrently(jobs: List[tuple], topics: "deque[str]", text_content: str, chars_per_token: float) -> List[Optional[Dict[str, Any]]]:
+    """
+    Runs all question jobs concurrently, drawing topics from a shared pool. A job
+    whose topic fails moves on to the next topic; if the pool runs dry, a single
+    extra topic analysis (excluding topics already used) refills it.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    used_topics = list(topics)
+    refill_task = None
+
+    async def _refill_topics():
+        fresh_topics = await analyze_text_for_topics(
+            text_content, num_topics=max(len(jobs), 5), exclude_topics=used_topics, chars_per_token=chars_per_token
+        )
+        fresh_topics = _dedupe_similar_topics(fresh_topics, existing=used_topics)
+        random.shuffle(fresh_topics)
+        log_progress("Refilled topic pool with %d new topics", len(fresh_topics))
+        used_topics.extend(fresh_topics)
+        topics.extend(fresh_topics)
+
+    async def _next_topic() -> Optional[str]:
+        nonlocal refill_task
+        if not topics:
+            if refill_task is None:
+                log_progress("Topic pool exhausted; requesting more topics...")
+                refill_task = asyncio.ensure_future(_refill_topics())
+            await refill_task
+        return topics.popleft() if topics else None
+
+    async def _gen_one(question_type: str, base_prompt: str, generation_index: int) -> Optional[Dict[str, Any]]:
+        async with semaphore:
+            while True:
+                topic = await _next_topic()
+                if topic is None:
+                    return None
+                question_data = await generate_single_question_for_topic_with_retry(
+                    base_prompt, question_type, topic, generation_index
+                )
+                question = _build_question(question_type, question_data)
+                if question:
+                    return question
+
+    return await asyncio.gather(*(_gen_one(*job) for job in jobs))
 
 def generate_questions_from_text(text_content: str, num_mcq: int = 0, num_short_answer: int = 0, num_long_answer: int = 0, subject: str = "General", grade_level: str = "N/A") -> Dict[str, List[Any]]:
     generated_questions = {"mcq": [], "short_answer": [], "long_answer": []}
@@ -228,98 +693,48 @@ def generate_questions_from_text(text_content: str, num_mcq: int = 0, num_short_
     if total_questions_needed <= 0:
         return generated_questions
 
-    num_topics_to_analyze = max(total_questions_needed * 2, 10)
-    available_topics = analyze_text_for_topics(text_content, num_topics=num_topics_to_analyze)
+    chars_per_token = _run_coroutine(measure_chars_per_token(text_content))
+
+    batched_questions = _run_coroutine(generate_all_questions_batched(
+        text_content, num_mcq, num_short_answer, num_long_answer, chars_per_token=chars_per_token
+    ))
+    questions_needed = {"mcq": num_mcq, "short_answer": num_short_answer, "long_answer": num_long_answer}
+    for question_type, count in questions_needed.items():
+        for question_data in batched_questions.get(question_type, [])[:count]:
+            question = _build_question(question_type, question_data)
+            if question:
+                generated_questions[question_type].append(question)
+        questions_needed[question_type] = count - len(generated_questions[question_type])
+
+    total_questions_needed = sum(questions_needed.values())
+    if total_questions_needed <= 0:
+        return generated_questions
+
+    log_progress("Batched call left %d questions short; falling back to per-topic generation.", total_questions_needed)
+    num_topics_to_analyze = max(total_questions_needed * 3, 15)
+    available_topics = _run_coroutine(analyze_text_for_topics(text_content, num_topics=num_topics_to_analyze, chars_per_token=chars_per_token))
 
     if not available_topics:
         log_progress("Failed to extract topics from the text.")
         return generated_questions
 
     random.shuffle(available_topics)
+    available_topics = deque(available_topics)
 
-    mcq_base_prompt = f"""Generate exactly ONE multiple choice question with 4 unique options based on the provided text.
-The response MUST be a JSON object in this format:
-{{
-  "question": "Your question here?",
-  "options": ["Option A", "Option B", "Option C", "Option D"],
-  "correct_option_index": 0
-}}
-
-Text: {text_content[:5000]}"""
-
-    saq_base_prompt_text = f"""Generate ONE short answer question based on the provided text.
-The response MUST be a JSON object in this format:
-{{ "question": "Your question here?", "guideline": "Guideline for answering here." }}
+    jobs = []
+    for question_type, count in questions_needed.items():
+        base_prompt = _base_prompt(question_type, text_content, chars_per_token)
+        for generation_index in range(1, count + 1):
+            jobs.append((question_type, base_prompt, generation_index))
+    # Interleave question types so rate-limited slots are shared by every section
+    # instead of all MCQs being served before the first short answer.
+    random.shuffle(jobs)
 
-Text content: {text_content[:5500]}"""
-
-    laq_base_prompt_text = f"""Generate ONE detailed essay question based on the provided text.
-The response MUST be a JSON object in this format:
-{{ "question": "Your essay question here?", "guideline": "Comprehensive answer guideline here." }}
-
-Text content: {text_content[:7000]}"""
-
-    # Generate MCQs
-    mcq_count = 0
-    while mcq_count < num_mcq and available_topics:
-        chosen_topic = available_topics.pop(0)
-        mcq_data = generate_single_question_for_topic_with_retry(
-            mcq_base_prompt, "mcq", chosen_topic, mcq_count + 1
-        )
-
-        if mcq_data:
-            try:
-                correct_answer_text_val = mcq_data['options'][mcq_data['correct_option_index']]
-                shuffled_options = list(mcq_data['options'])
-                random.shuffle(shuffled_options)
-                new_correct_index = shuffled_options.index(correct_answer_text_val)
-
-                generated_questions["mcq"].append({
-                    "type": "mcq",
-                    "question": mcq_data["question"],
-                    "options": shuffled_options,
-                    "correct_option_index": new_correct_index,
-                    "marks": 1
-                })
-                mcq_count += 1
-            except (IndexError, ValueError) as e:
-                log_progress(f"Error processing MCQ: {str(e)}")
-                continue
-
-    # Generate Short Answer Questions
-    if num_short_answer > 0:
-        saq_count = 0
-        while saq_count < num_short_answer and available_topics:
-            chosen_topic = available_topics.pop(0)
-            saq_data = generate_single_question_for_topic_with_retry(
-                saq_base_prompt_text, "short_answer", chosen_topic, saq_count + 1
-            )
-
-            if saq_data:
-                generated_questions["short_answer"].append({
-                    "type": "short_answer",
-                    "question": saq_data["question"],
-                    "answer_guideline": saq_data.get('guideline', ''),
-                    "marks": 4
-                })
-                saq_count += 1
-
-    # Generate Long Answer Questions
-    if num_long_answer > 0:
-        laq_count = 0
-        while laq_count < num_long_answer and available_topics:
-            chosen_topic = available_topics.pop(0)
-            laq_data = generate_single_question_for_topic_with_retry(
-                laq_base_prompt_text, "long_answer", chosen_topic, laq_count + 1
-            )
+    log_progress("Submitting %d question requests (max %d concurrent)...", len(jobs), MAX_CONCURRENT_REQUESTS)
+    results = _run_coroutine(_generate_concurrently(jobs, available_topics, text_content, chars_per_token))
 
-            if laq_data:
-                generated_questions["long_answer"].append({
-                    "type": "long_answer",
-                    "question": laq_data["question"],
-                    "answer_guideline": laq_data.get('guideline', ''),
-                    "marks": 8
-                })
-                laq_count += 1
+    for (question_type, _, _), question in zip(jobs, results):
+        if question:
+            generated_questions[question_type].append(question)
 
-    return generated_questions
\ No newline at end of file
+    return generated_questions
@@ -9,14 +9,15 @@ if not api_key:
 try:
     genai.configure(api_key=api_key)
     print("Attempting to list models...")
-    
-    for m in genai.list_models():
-        print(f"- Name: {m.name}")
-        print(f"  Display Name: {m.display_name}")
-        print(f"  Supported Methods: {m.supported_generation_methods}")
-        
-        if 'generateContent' in m.supported_generation_methods and ('gemini-pro' in m.name or 'gemini-1.0-pro' in m.name):
-            print(f"  *** Found Gemini Pro model: {m.name}")
-            
+
+    models = list(genai.list_models())
+    pro_models = [
+        m for m in models
+        if 'generateContent' in m.supported_generation_methods and ('gemini-pro' in m.name or 'gemini-1.0-pro' in m.name)
+    ]
+    print(f"Listed {len(models)} models, {len(pro_models)} Gemini Pro models support generateContent:")
+    for m in pro_models:
+        print(f"  *** Found Gemini Pro model: {m.name} ({m.display_name})")
+
 except Exception as e:
     print(f"Error during API check: {e}")
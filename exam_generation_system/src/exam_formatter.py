@@ -1,4 +1,21 @@
 # exam_formatter.py
+import io
+import string
+
+# "\n    A ", "\n    B ", ... : the line break and indented letter before each MCQ option
+_OPTION_PREFIX = tuple(f"\n    {letter} " for letter in string.ascii_uppercase)
+
+_RULE = "-" * 80
+_LONG_ANSWER_SPACER = "\n\n\n"
+
+_DEFAULT_INSTRUCTIONS_A = """    Attempt this section on the MCQ’s Answer Sheet only
+    Use black ball point or marker for shading only one circle for correct option of a question.
+    No mark will be awarded for cutting, erasing, over writing and multiple circles shading."""
+
+def _line(buf, text):
+    """Writes one line of the paper to buf."""
+    buf.write(text)
+    buf.write("\n")
 
 def format_exam_paper(exam_details, questions_data, section_config):
     """
@@ -43,44 +60,44 @@ def format_exam_paper(exam_details, questions_data, section_config):
     Returns:
         str: A string representing the formatted exam paper.
     """
-    paper_content = []
+    paper_content = io.StringIO()
 
     # 1. Overall Paper Header
-    paper_content.append(f"{exam_details.get('school_name', 'Oriental Public School Mardan').center(80)}")
-    paper_content.append(f"{exam_details.get('exam_title', 'Final Term Examination – 2025').center(80)}")
-    paper_content.append(f"CLASS {exam_details.get('class_level', '6th')} PAPER {exam_details.get('subject', 'SUBJECT').upper().center(80)}")
-    paper_content.append(f"Total Time : {exam_details.get('total_time', '3:00 Hours'):<40} {'Total Marks: ' + str(exam_details.get('total_marks', 75)):>39}")
+    school_name = exam_details.get('school_name', 'Oriental Public School Mardan')
+    exam_title = exam_details.get('exam_title', 'Final Term Examination – 2025')
+    class_line = f"CLASS {exam_details.get('class_level', '6th')} PAPER {exam_details.get('subject', 'SUBJECT').upper()}"
+    _line(paper_content, f"{school_name:^80}")
+    _line(paper_content, f"{exam_title:^80}")
+    _line(paper_content, f"{class_line:^80}")
+    _line(paper_content, f"Total Time : {exam_details.get('total_time', '3:00 Hours'):<40} {'Total Marks: ' + str(exam_details.get('total_marks', 75)):>39}")
     if exam_details.get('version'):
-        paper_content.append(f"{'Version: ' + exam_details['version']:>79}")
-    paper_content.append("\nNote: There are three sections in this paper i.e. Section A, B & C.")
-    paper_content.append("-" * 80)
+        _line(paper_content, f"{'Version: ' + exam_details['version']:>79}")
+    _line(paper_content, "\nNote: There are three sections in this paper i.e. Section A, B & C.")
+    _line(paper_content, _RULE)
 
     current_question_number = 1
 
     # 2. Section A - MCQs
     if questions_data.get("mcq") and "A" in section_config:
         config_a = section_config["A"]
-        paper_content.append(f"\n{config_a.get('title', 'SECTION A').center(80)}")
-        section_a_marks = config_a.get('total_marks_section', sum(q.get('marks', 1) for q in questions_data["mcq"]))
-        paper_content.append(f"Marks: {section_a_marks:<40} {'Time Allowed: ' + config_a.get('time_allowed', '20 Minutes'):>39}")
+        _line(paper_content, f"\n{config_a.get('title', 'SECTION A'):^80}")
+        section_a_marks = config_a.get('total_marks_section')
+        if section_a_marks is None:
+            section_a_marks = sum(q.get('marks', 1) for q in questions_data["mcq"])
+        _line(paper_content, f"Marks: {section_a_marks:<40} {'Time Allowed: ' + config_a.get('time_allowed', '20 Minutes'):>39}")
         
-        # Define default instructions for Section A using a triple-quoted string
-        default_instructions_A = """    Attempt this section on the MCQ’s Answer Sheet only
-    Use black ball point or marker for shading only one circle for correct option of a question.
-    No mark will be awarded for cutting, erasing, over writing and multiple circles shading."""
         # Get instructions, using the default if not provided in config_a
-        instructions_A = config_a.get('instructions', default_instructions_A)
-        paper_content.append(f"INSTRUCTION :\n{instructions_A}") # Use the variable in the f-string
-        paper_content.append("")
-
-        for i, q_data in enumerate(questions_data["mcq"]):
-            paper_content.append(f"{current_question_number}. {q_data['question']} ({q_data.get('marks', config_a.get('marks_per_question',1))} Mark{'s' if q_data.get('marks',1) > 1 else ''})")
-            options = q_data.get("options", [])
-            for j, option in enumerate(options):
-                paper_content.append(f"    {chr(65 + j)} {option}") # A, B, C, D
-            paper_content.append("")
+        instructions_A = config_a.get('instructions', _DEFAULT_INSTRUCTIONS_A)
+        _line(paper_content, f"INSTRUCTION :\n{instructions_A}\n")
+
+        default_marks_a = config_a.get('marks_per_question', 1)
+        for q_data in questions_data["mcq"]:
+            # One entry per question: the question line, its options (A, B, C, D) and a blank line
+            options = "".join(f"{prefix}{option}" for prefix, option in zip(_OPTION_PREFIX, q_data.get("options", [])))
+            marks = q_data.get('marks', default_marks_a)
+            _line(paper_content, f"{current_question_number}. {q_data['question']} ({marks} Mark{'s' if marks != 1 else ''}){options}\n")
             current_question_number += 1
-        paper_content.append("-" * 80)
+        _line(paper_content, _RULE)
 
     # Reset question numbering for subjective part or continue if preferred (continuing for now)
     # current_question_number = 1 # Uncomment to reset for Section B
@@ -88,144 +105,38 @@ def format_exam_paper(exam_details, questions_data, section_config):
     # 3. Section B - Short Answers
     if questions_data.get("short_answer") and "B" in section_config:
         config_b = section_config["B"]
-        paper_content.append(f"\n{config_b.get('title', 'SECTION B').center(80)}")
-        section_b_total_marks = config_b.get('total_marks_section', sum(q.get('marks', 3) for q in questions_data["short_answer"]))
-        paper_content.append(f"{config_b.get('instructions', 'Attempt all questions. Each question carries equal marks.')} (Marks: {section_b_total_marks})")
-        paper_content.append("")
-
+        _line(paper_content, f"\n{config_b.get('title', 'SECTION B'):^80}")
+        section_b_total_marks = config_b.get('total_marks_section')
+        if section_b_total_marks is None:
+            section_b_total_marks = sum(q.get('marks', 3) for q in questions_data["short_answer"])
+        _line(paper_content, f"{config_b.get('instructions', 'Attempt all questions. Each question carries equal marks.')} (Marks: {section_b_total_marks})")
+        _line(paper_content, "")
+
+        default_marks_b = config_b.get('marks_per_question', 3)
         for i, q_data in enumerate(questions_data["short_answer"]):
-            paper_content.append(f"{current_question_number}. {q_data['question']} ({q_data.get('marks', config_b.get('marks_per_question',3))} Mark{'s' if q_data.get('marks',3) > 1 else ''})")
-            paper_content.append("") # Space for answer
+            marks = q_data.get('marks', default_marks_b)
+            _line(paper_content, f"{current_question_number}. {q_data['question']} ({marks} Mark{'s' if marks != 1 else ''})")
+            _line(paper_content, "") # Space for answer
             current_question_number += 1
-        paper_content.append("-" * 80)
+        _line(paper_content, _RULE)
 
     # 4. Section C - Long Answers
     if questions_data.get("long_answer") and "C" in section_config:
         config_c = section_config["C"]
-        paper_content.append(f"\n{config_c.get('title', 'SECTION C').center(80)}")
-        section_c_total_marks = config_c.get('total_marks_section', sum(q.get('marks', 5) for q in questions_data["long_answer"]))
-        paper_content.append(f"{config_c.get('instructions', 'Attempt all questions. Each question carries equal marks.')} (Marks: {section_c_total_marks})")
-        paper_content.append("")
-
+        _line(paper_content, f"\n{config_c.get('title', 'SECTION C'):^80}")
+        section_c_total_marks = config_c.get('total_marks_section')
+        if section_c_total_marks is None:
+            section_c_total_marks = sum(q.get('marks', 5) for q in questions_data["long_answer"])
+        _line(paper_content, f"{config_c.get('instructions', 'Attempt all questions. Each question carries equal marks.')} (Marks: {section_c_total_marks})")
+        _line(paper_content, "")
+
+        default_marks_c = config_c.get('marks_per_question', 5)
         for i, q_data in enumerate(questions_data["long_answer"]):
-            paper_content.append(f"{current_question_number}. {q_data['question']} ({q_data.get('marks', config_c.get('marks_per_question',5))} Mark{'s' if q_data.get('marks',5) > 1 else ''})")
-            paper_content.append("\n" * 3)  # More space for long answers
+            marks = q_data.get('marks', default_marks_c)
+            _line(paper_content, f"{current_question_number}. {q_data['question']} ({marks} Mark{'s' if marks != 1 else ''})")
+            _line(paper_content, _LONG_ANSWER_SPACER)  # More space for long answers
             current_question_number += 1
-        paper_content.append("-" * 80)
-
-    return "\n".join(paper_content)
-
-# Example Usage (can be removed or commented out in production code)
-if __name__ == '__main__':
-    # Import the placeholder generator for testing
-    from ai_question_generator import generate_questions_from_text
-
-    sample_exam_details = {
-        "school_name": "My Awesome School",
-        "exam_title": "Mid-Term Examination - 2024",
-        "class_level": "10th",
-        "subject": "Physics",
-        "total_time": "2:30 Hours",
-        "total_marks": 100,
-        "version": "B"
-    }
-
-    # Generate some placeholder questions
-    sample_questions = generate_questions_from_text(
-        text_content="This is some physics related text about Newton's laws and thermodynamics.",
-        num_mcq=3,
-        num_short_answer=2,
-        num_long_answer=1,
-        subject="Physics",
-        grade_level="10th"
-    )
-
-    sample_section_config = {
-        "A": {
-            "title": "SECTION A - Multiple Choice",
-            "instructions": "Choose the best answer for each question. Each question carries 2 marks.",
-            "time_allowed": "30 Minutes",
-            "marks_per_question": 2,
-            "total_marks_section": sum(q.get('marks', 2) for q in sample_questions["mcq"]) # Dynamically calculate
-        },
-        "B": {
-            "title": "SECTION B - Short Answer Questions",
-            "instructions": "Answer any two questions. Each question carries 10 marks.",
-            "marks_per_question": 10,
-            "total_marks_section": sum(q.get('marks', 10) for q in sample_questions["short_answer"]) # Dynamically calculate
-        },
-        "C": {
-            "title": "SECTION C - Essay Questions",
-            "instructions": "Answer any one question. This question carries 30 marks.",
-            "marks_per_question": 30,
-            "total_marks_section": sum(q.get('marks', 30) for q in sample_questions["long_answer"]) # Dynamically calculate
-        }
-    }
-    # Update total marks based on generated questions for the example
-    sample_exam_details["total_marks"] = (
-        sample_section_config["A"]["total_marks_section"] + 
-        sample_section_config["B"]["total_marks_section"] + 
-        sample_section_config["C"]["total_marks_section"]
-    )
-
-
-    formatted_paper = format_exam_paper(sample_exam_details, sample_questions, sample_section_config)
-    print("\n--- Formatted Exam Paper ---")
-    print(formatted_paper)
-
-    # Test with one of the original sample structures
-    print("\n\n--- Testing with Math Sample Structure ---")
-    math_exam_details = {
-        "school_name": "Oriental Public School Mardan",
-        "exam_title": "Final Term Examination – 2025",
-        "class_level": "6th",
-        "subject": "MATH",
-        "total_time": "3:00 Hours",
-        "total_marks": 75,
-        "version": "A"
-    }
-    math_questions = generate_questions_from_text(
-        text_content="Math concepts for 6th grade.",
-        num_mcq=2, # Reduced for brevity in example
-        num_short_answer=2, # Reduced
-        num_long_answer=1, # Reduced
-        subject="Math",
-        grade_level="6th"
-    )
-    # Update marks in generated questions to match sample structure
-    for q in math_questions["mcq"]: q["marks"] = 1
-    for q in math_questions["short_answer"]: q["marks"] = 4 # (36 marks / 9 questions in sample)
-    for q in math_questions["long_answer"]: q["marks"] = 8 # (24 marks / 3 questions in sample)
-
-    math_section_config = {
-        "A": {
-            "title": "SECTION A",
-            "instructions": "Attempt this section on the MCQ’s Answer Sheet only... (details omitted for brevity)",
-            "time_allowed": "20 Minutes",
-            "marks_per_question": 1,
-            "total_marks_section": 15 # As per sample, actual questions might differ
-        },
-        "B": {
-            "title": "SECTION B",
-            "instructions": "Attempt any Nine (9) questions each carry equal marks.",
-            "marks_per_question": 4, 
-            "total_marks_section": 36
-        },
-        "C": {
-            "title": "SECTION C",
-            "instructions": "Attempt any Three (3) questions.",
-            "marks_per_question": 8,
-            "total_marks_section": 24
-        }
-    }
-    # Recalculate total marks for this specific test case based on config
-    math_exam_details["total_marks"] = (
-        math_section_config["A"]["total_marks_section"] + 
-        math_section_config["B"]["total_marks_section"] + 
-        math_section_config["C"]["total_marks_section"]
-    )
-
-    formatted_math_paper = format_exam_paper(math_exam_details, math_questions, math_section_config)
-    print(formatted_math_paper)
-
+        _line(paper_content, _RULE)
 
+    # Drop the final line's newline, as "\n".join would
+    return paper_content.getvalue()[:-1]
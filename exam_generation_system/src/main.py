@@ -5,14 +5,20 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__))) # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(__file__)) # Add src to path for module imports
 
-from flask import Flask, render_template, request, redirect, url_for, send_from_directory, make_response
+from flask import Flask, Response, render_template, request, redirect, url_for, send_from_directory, jsonify
 from werkzeug.utils import secure_filename
 import datetime
+import hashlib
+import re
+import shutil
+import threading
+from collections import OrderedDict
 
 # Import custom modules
 from pdf_parser import extract_text_from_pdf
-from ai_question_generator import generate_questions_from_text # Placeholder
+from ai_question_generator import generate_questions_from_text
 from exam_formatter import format_exam_paper
+from tasks import submit_job, get_job
 
 app = Flask(__name__)
 
@@ -21,6 +27,11 @@ UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["MAX_CONTENT_LENGTH"] = 50 * 1024 * 1024  # 50 MB max upload size
 ALLOWED_EXTENSIONS = {"pdf"}
+UPLOAD_COPY_BUFFER = 4 * 1024 * 1024  # Copy uploads in 4 MB chunks rather than Werkzeug's 16 KB
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # Slice size for streamed paper downloads
+MAX_CACHED_PAPERS = 64  # Encoded papers kept for download, oldest dropped first
+MAX_QUESTIONS_PER_TYPE = 500  # Upper bound on each requested question count
+_SAFE_NAME = re.compile(r"[^A-Za-z0-9._-]+")  # Download names are ours, so plain ASCII is enough
 
 # Create upload folder if it doesn't exist
 if not os.path.exists(UPLOAD_FOLDER):
@@ -29,17 +40,120 @@ if not os.path.exists(UPLOAD_FOLDER):
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# (upload folder mtime_ns, book list); the folder's mtime changes whenever a
+# book is added or removed, so a matching mtime means the list is current.
+_books_cache = (None, [])
+
 def get_available_books():
-    if not os.path.exists(UPLOAD_FOLDER):
+    global _books_cache
+    try:
+        mtime = os.stat(UPLOAD_FOLDER).st_mtime_ns
+    except OSError:
         return []
-    return [f for f in os.listdir(UPLOAD_FOLDER) if os.path.isfile(os.path.join(UPLOAD_FOLDER, f)) and f.endswith(".pdf")]
+    cached_mtime, books = _books_cache
+    if mtime != cached_mtime:
+        with os.scandir(UPLOAD_FOLDER) as entries:
+            books = [entry.name for entry in entries if entry.is_file() and entry.name[-4:].lower() == ".pdf"]
+        _books_cache = (mtime, books)
+    return list(books)
+
+# paper id (hash of the encoded paper) -> UTF-8 bytes served by download_exam
+_paper_bytes = OrderedDict()
+_paper_bytes_lock = threading.Lock()
+
+def _remember_paper(paper_bytes):
+    """Caches an encoded paper for download and returns its id."""
+    paper_id = hashlib.blake2b(paper_bytes, digest_size=16).hexdigest()
+    with _paper_bytes_lock:
+        _paper_bytes[paper_id] = paper_bytes
+        _paper_bytes.move_to_end(paper_id)
+        while len(_paper_bytes) > MAX_CACHED_PAPERS:
+            _paper_bytes.popitem(last=False)
+    return paper_id
+
+def build_exam_paper(book_path, book_filename, exam_details, question_config):
+    """
+    Extracts the book text, generates the questions and formats the exam paper.
+    Runs on the background worker pool; see tasks.submit_job.
+
+    Returns:
+        dict: "paper" and "filename" of the formatted paper, and an "error"
+        message if something went wrong (with no paper if it was fatal).
+    """
+    # 1. Extract text from PDF
+    extracted_text = extract_text_from_pdf(book_path)
+    if extracted_text is None:
+        return {"error": f"Failed to extract text from {book_filename}. The PDF might be image-based or corrupted."}
+    
+    error_message = None
+    if not extracted_text.strip():
+         error_message = f"Extracted text from {book_filename} is empty. The PDF might be image-based or scanned. Please use a text-based PDF."
+         # Still proceed to show the paper with the error
+
+    # 2. Generate Questions (Gemini)
+    questions_data = generate_questions_from_text(
+        text_content=extracted_text,
+        num_mcq=question_config["num_mcq"],
+        num_short_answer=question_config["num_short_answer"],
+        num_long_answer=question_config["num_long_answer"],
+        subject=exam_details.get("subject", "N/A"),
+        grade_level=exam_details.get("class_level", "N/A")
+    )
+
+    # 3. Format Exam Paper
+    # Define section configurations (can be made more dynamic later)
+    total_mcq_marks = question_config["num_mcq"] * 1 # Assuming 1 mark per MCQ
+    total_short_marks = question_config["num_short_answer"] * 4 # Assuming 4 marks per short q
+    total_long_marks = question_config["num_long_answer"] * 8 # Assuming 8 marks per long q
+    total_exam_marks = total_mcq_marks + total_short_marks + total_long_marks
+    exam_details = dict(exam_details, total_marks=total_exam_marks) # Copy; the request thread still renders the original
+    
+    section_config = {
+        "A": {
+            "title": "SECTION A",
+            "instructions": "Attempt this section on the MCQ’s Answer Sheet only. Use black ball point or marker for shading only one circle for correct option of a question. No mark will be awarded for cutting, erasing, over writing and multiple circles shading.",
+            "time_allowed": "20 Minutes", # Placeholder, can be dynamic
+            "marks_per_question": 1,
+            "total_marks_section": total_mcq_marks
+        },
+        "B": {
+            "title": "SECTION B",
+            "instructions": f"Attempt any {question_config['num_short_answer']} questions. Each question carries equal marks.",
+            "marks_per_question": 4, 
+            "total_marks_section": total_short_marks
+        },
+        "C": {
+            "title": "SECTION C",
+            "instructions": f"Attempt any {question_config['num_long_answer']} questions. Each question carries equal marks.",
+            "marks_per_question": 8,
+            "total_marks_section": total_long_marks
+        }
+    }
+
+    generated_paper_content = format_exam_paper(exam_details, questions_data, section_config)
+    
+    # Prepare filename for download
+    subject_sanitized = exam_details.get("subject", "exam").replace(" ", "_")
+    class_sanitized = exam_details.get("class_level", "paper").replace(" ", "_")
+    paper_filename_to_download = f"{subject_sanitized}_{class_sanitized}_paper_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}.txt"
+
+    # Encode once; the download is served from these bytes
+    paper_id = _remember_paper(generated_paper_content.encode("utf-8"))
+
+    return {"paper": generated_paper_content, "paper_id": paper_id, "filename": paper_filename_to_download, "error": error_message}
+
+def _iget(name, default=0, cap=MAX_QUESTIONS_PER_TYPE):
+    """Reads an integer form field clamped to [0, cap], or default if it isn't a number."""
+    try:
+        return min(cap, max(0, int(request.form.get(name, default))))
+    except ValueError:
+        return default
 
 @app.route("/", methods=["GET", "POST"])
 def index():
     available_books = get_available_books()
-    generated_paper_content = None
     error_message = None
-    paper_filename_to_download = None
+    job_id = None
     selected_book_on_post = None
     exam_details_on_post = {}
     question_config_on_post = {}
@@ -55,9 +169,9 @@ def index():
             "version": request.form.get("version")
         }
         question_config_on_post = {
-            "num_mcq": int(request.form.get("num_mcq", 0)),
-            "num_short_answer": int(request.form.get("num_short_answer", 0)),
-            "num_long_answer": int(request.form.get("num_long_answer", 0))
+            "num_mcq": _iget("num_mcq"),
+            "num_short_answer": _iget("num_short_answer"),
+            "num_long_answer": _iget("num_long_answer")
         }
 
         book_path = None
@@ -70,9 +184,11 @@ def index():
                 if file and allowed_file(file.filename):
                     filename = secure_filename(file.filename)
                     book_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                    file.save(book_path)
+                    with open(book_path, "wb") as dst:
+                        shutil.copyfileobj(file.stream, dst, length=UPLOAD_COPY_BUFFER)
                     book_filename = filename
-                    available_books = get_available_books() # Refresh list
+                    if filename not in available_books: # No need to rescan the folder for the new book
+                        available_books.append(filename)
                     selected_book_on_post = filename # Select the newly uploaded book
                 else:
                     error_message = "Invalid file type. Only PDF files are allowed."
@@ -94,82 +210,49 @@ def index():
             error_message = f"Selected book '{book_filename}' not found."
             return render_template("index.html", available_books=available_books, error_message=error_message, selected_book=selected_book_on_post, exam_details=exam_details_on_post, question_config=question_config_on_post)
 
-        # 1. Extract text from PDF
-        extracted_text = extract_text_from_pdf(book_path)
-        if extracted_text is None:
-            error_message = f"Failed to extract text from {book_filename}. The PDF might be image-based or corrupted."
+        if not any(question_config_on_post.values()):
+            error_message = "Please request at least one question."
             return render_template("index.html", available_books=available_books, error_message=error_message, selected_book=selected_book_on_post, exam_details=exam_details_on_post, question_config=question_config_on_post)
-        
-        if not extracted_text.strip():
-             error_message = f"Extracted text from {book_filename} is empty. The PDF might be image-based or scanned. Please use a text-based PDF."
-             # Still proceed to show the template with the error
-
-        # 2. Generate Questions (using placeholder)
-        questions_data = generate_questions_from_text(
-            text_content=extracted_text,
-            num_mcq=question_config_on_post["num_mcq"],
-            num_short_answer=question_config_on_post["num_short_answer"],
-            num_long_answer=question_config_on_post["num_long_answer"],
-            subject=exam_details_on_post.get("subject", "N/A"),
-            grade_level=exam_details_on_post.get("class_level", "N/A")
-        )
-
-        # 3. Format Exam Paper
-        # Define section configurations (can be made more dynamic later)
-        total_mcq_marks = question_config_on_post["num_mcq"] * 1 # Assuming 1 mark per MCQ
-        total_short_marks = question_config_on_post["num_short_answer"] * 4 # Assuming 4 marks per short q
-        total_long_marks = question_config_on_post["num_long_answer"] * 8 # Assuming 8 marks per long q
-        total_exam_marks = total_mcq_marks + total_short_marks + total_long_marks
-        exam_details_on_post["total_marks"] = total_exam_marks
-        
-        section_config = {
-            "A": {
-                "title": "SECTION A",
-                "instructions": "Attempt this section on the MCQ’s Answer Sheet only. Use black ball point or marker for shading only one circle for correct option of a question. No mark will be awarded for cutting, erasing, over writing and multiple circles shading.",
-                "time_allowed": "20 Minutes", # Placeholder, can be dynamic
-                "marks_per_question": 1,
-                "total_marks_section": total_mcq_marks
-            },
-            "B": {
-                "title": "SECTION B",
-                "instructions": f"Attempt any {question_config_on_post['num_short_answer']} questions. Each question carries equal marks.",
-                "marks_per_question": 4, 
-                "total_marks_section": total_short_marks
-            },
-            "C": {
-                "title": "SECTION C",
-                "instructions": f"Attempt any {question_config_on_post['num_long_answer']} questions. Each question carries equal marks.",
-                "marks_per_question": 8,
-                "total_marks_section": total_long_marks
-            }
-        }
 
-        generated_paper_content = format_exam_paper(exam_details_on_post, questions_data, section_config)
-        
-        # Prepare filename for download
-        subject_sanitized = exam_details_on_post.get("subject", "exam").replace(" ", "_")
-        class_sanitized = exam_details_on_post.get("class_level", "paper").replace(" ", "_")
-        paper_filename_to_download = f"{subject_sanitized}_{class_sanitized}_paper_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}.txt"
+        # Extraction and generation can take a minute, so they run as a background job
+        job_id = submit_job(build_exam_paper, book_path, book_filename, exam_details_on_post, question_config_on_post)
 
     return render_template(
         "index.html", 
         available_books=available_books, 
-        generated_paper=generated_paper_content, 
+        job_id=job_id,
         error_message=error_message,
-        paper_filename=paper_filename_to_download,
         selected_book=selected_book_on_post,
         exam_details=exam_details_on_post,
         question_config=question_config_on_post
     )
 
+@app.route("/status/<job_id>")
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"status": "unknown"}), 404
+    return jsonify(job)
+
+def _iter_chunks(data, size):
+    """Yields data in slices of at most size bytes so the server can stream it."""
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
 @app.route("/download_exam", methods=["POST"])
 def download_exam():
-    paper_content = request.form.get("paper_content")
     paper_filename = request.form.get("paper_filename", "exam_paper.txt")
-    if paper_content:
-        response = make_response(paper_content)
-        response.headers["Content-Disposition"] = f"attachment; filename={secure_filename(paper_filename)}"
-        response.headers["Content-Type"] = "text/plain"
+    with _paper_bytes_lock:
+        body = _paper_bytes.get(request.form.get("paper_id"))
+    if body is None:
+        # Evicted or from before a restart: fall back to the posted text
+        paper_content = request.form.get("paper_content")
+        body = paper_content.encode("utf-8") if paper_content else None
+    if body:
+        response = Response(_iter_chunks(body, DOWNLOAD_CHUNK_SIZE), mimetype="text/plain")
+        safe_filename = _SAFE_NAME.sub("_", paper_filename)[:255] or "exam_paper.txt"
+        response.headers["Content-Disposition"] = f"attachment; filename={safe_filename}"
+        response.headers["Content-Length"] = str(len(body))
         return response
     return redirect(url_for("index"))
 
@@ -1,10 +1,86 @@
 
-import PyPDF2
+import pypdfium2 as pdfium
+import functools
 import os
+import re
+import threading
 
+# Extracted text is cached next to the PDFs, in a hidden directory that
+# get_available_books() never lists.
+CACHE_DIR_NAME = ".cache"
+
+# PDFium is not thread-safe and pypdfium2 adds no locking of its own, while
+# exam jobs run on several worker threads. Every PDFium call, from opening a
+# document to closing it, happens under this lock.
+_pdfium_lock = threading.Lock()
+
+def _text_cache_path(pdf_path):
+    """
+    Returns the cache file for pdf_path, named after the book plus its size and
+    mtime so that replacing a book with a new upload invalidates the cached text.
+    """
+    st = os.stat(pdf_path)
+    cache_name = f"{os.path.basename(pdf_path)}.{st.st_size}-{st.st_mtime_ns}.txt"
+    return os.path.join(os.path.dirname(pdf_path), CACHE_DIR_NAME, cache_name)
+
+def _prune_stale_text(cache_path):
+    """Removes the cached text of earlier versions of the same book."""
+    cache_dir, current_name = os.path.split(cache_path)
+    stale_name = re.compile(re.escape(current_name.rsplit(".", 2)[0]) + r"\.\d+-\d+\.txt")
+    with os.scandir(cache_dir) as entries:
+        for entry in entries:
+            if entry.name != current_name and stale_name.fullmatch(entry.name):
+                os.remove(entry.path)
+
+def cache_extracted_text(extract):
+    """
+    Decorator that memoizes an extractor's text on disk. Failed extractions
+    (None) are not cached, so they are retried on the next request.
+    """
+    @functools.wraps(extract)
+    def wrapper(pdf_path):
+        try:
+            cache_path = _text_cache_path(pdf_path)
+        except OSError:
+            return extract(pdf_path)
+
+        try:
+            with open(cache_path, encoding="utf-8", newline="") as f:
+                return f.read()
+        except OSError:
+            pass
+
+        text = extract(pdf_path)
+        if text is not None:
+            try:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+                    f.write(text)
+                os.replace(tmp_path, cache_path)
+                _prune_stale_text(cache_path)
+            except OSError as e:
+                print(f"Warning: Could not write extracted text cache: {e}")
+        return text
+    return wrapper
+
+def _page_text(pdf, index):
+    """Returns the text of one page, releasing its native handles straight away.
+    The caller must hold _pdfium_lock."""
+    page = pdf[index]
+    try:
+        textpage = page.get_textpage()
+        try:
+            return textpage.get_text_bounded()
+        finally:
+            textpage.close()
+    finally:
+        page.close()
+
+@cache_extracted_text
 def extract_text_from_pdf(pdf_path):
     """
-    Extracts text content from a given PDF file using PyPDF2.
+    Extracts text content from a given PDF file using PDFium (pypdfium2).
 
     Args:
         pdf_path (str): The absolute path to the PDF file.
@@ -17,11 +93,13 @@ def extract_text_from_pdf(pdf_path):
         return None
 
     try:
-        text = ""
-        with open(pdf_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            for page in reader.pages:
-                text += page.extract_text()
+        with _pdfium_lock:
+            pdf = pdfium.PdfDocument(pdf_path)
+            try:
+                parts = [_page_text(pdf, i) for i in range(len(pdf))]
+            finally:
+                pdf.close()
+        text = "".join(parts)
 
         if not text.strip():
             print("Warning: Extracted text is empty. The PDF might be image-based.")
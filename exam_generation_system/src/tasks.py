@@ -0,0 +1,50 @@
+# tasks.py
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Exam generation spends its time waiting on the Gemini API, so a thread pool is
+# enough and keeps every job on the same process-wide rate limiter.
+MAX_WORKERS = int(os.getenv('EXAMGEN_WORKERS', '4'))
+MAX_TRACKED_JOBS = 256  # Oldest finished jobs are forgotten beyond this
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="examgen-job")
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+def submit_job(func, *args, **kwargs):
+    """
+    Runs func(*args, **kwargs) on the background worker pool.
+
+    Returns:
+        str: A job id that can be passed to get_job to poll for the result.
+    """
+    job_id = uuid.uuid4().hex
+    future = _executor.submit(func, *args, **kwargs)
+    with _jobs_lock:
+        _jobs[job_id] = future
+        if len(_jobs) > MAX_TRACKED_JOBS:
+            for old_id in [jid for jid, f in _jobs.items() if f.done()][:len(_jobs) - MAX_TRACKED_JOBS]:
+                del _jobs[old_id]
+    return job_id
+
+def get_job(job_id):
+    """
+    Looks up a submitted job.
+
+    Returns:
+        dict: {"status": "pending"}, {"status": "done", "result": ...} or
+        {"status": "error", "error": str}; None if the job id is unknown.
+    """
+    with _jobs_lock:
+        future = _jobs.get(job_id)
+    if future is None:
+        return None
+    if not future.done():
+        return {"status": "pending"}
+    exc = future.exception()
+    if exc is not None:
+        return {"status": "error", "error": f"{type(exc).__name__}: {exc}"}
+    return {"status": "done", "result": future.result()}